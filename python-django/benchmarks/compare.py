@@ -0,0 +1,48 @@
+"""
+Compares two benchmark results and flags regressions.
+
+    python -m benchmarks.compare baseline.json current.json --threshold 10
+
+A case regresses when its p95 latency grows by more than the threshold (in percent)
+or when it makes more SQL queries per call. Exits with code 1 if there are regressions.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path, encoding='utf-8') as source:
+        return {(result['size'], result['case']): result for result in json.load(source)['results']}
+
+
+def compare(baseline, current, threshold):
+    rows = []
+    for key in sorted(set(baseline) & set(current)):
+        old, new = baseline[key], current[key]
+        change = (new['p95_ms'] - old['p95_ms']) * 100.0 / old['p95_ms'] if old['p95_ms'] else 0
+        regression = change > threshold or new['queries'] > old['queries']
+        rows.append((key, old, new, change, regression))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=10, help='Допустимый рост p95 в процентах')
+    args = parser.parse_args()
+
+    rows = compare(load(args.baseline), load(args.current), args.threshold)
+
+    for (size, case), old, new, change, regression in rows:
+        print('%-8s %-36s p95 %8.2f -> %8.2fms (%+6.1f%%)  queries %4d -> %4d  %s' % (
+            size, case, old['p95_ms'], new['p95_ms'], change, old['queries'], new['queries'],
+            'REGRESSION' if regression else ''))
+
+    if any(row[-1] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
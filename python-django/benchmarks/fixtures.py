@@ -0,0 +1,143 @@
+"""
+Generators of realistic catalogs, carts and order histories for benchmarks.
+"""
+import datetime
+import random
+from collections import defaultdict
+
+from django.utils import timezone
+
+from cleaning.models import (Category, Subject, Service, SubjectService, CartUnit, Cart, Order, PaymentMethod,
+                             Client)
+
+SIZES = {
+    'small': dict(categories=5, subjects=50, services=5, clients=10, carts=100, orders=1000),
+    'medium': dict(categories=15, subjects=300, services=10, clients=50, carts=1000, orders=10000),
+    'large': dict(categories=40, subjects=1000, services=15, clients=200, carts=5000, orders=100000),
+}
+
+MEASUREMENT_TYPES = [code for code, name in Subject.MEASUREMENT_TYPES]
+
+PAYMENT_METHODS = (
+    ('Наличными курьеру', False),
+    ('Банковской картой', True),
+)
+
+
+def create_catalog(rnd, categories, subjects, services):
+    Category.objects.bulk_create([
+        Category(name='Категория %d' % i, description='', icon_url='catalog/categories/%d.svg' % i,
+                 enabled=True, sort_number=i)
+        for i in range(categories)
+    ])
+    category_ids = list(Category.objects.values_list('pk', flat=True))
+
+    Service.objects.bulk_create([
+        Service(name='Услуга %d' % i, icon_url='catalog/services/%d.svg' % i)
+        for i in range(services)
+    ])
+    service_ids = list(Service.objects.values_list('pk', flat=True))
+
+    Subject.objects.bulk_create([
+        Subject(category_id=rnd.choice(category_ids), name='Вещь %d' % i, description='', enabled=True,
+                measurement_type=rnd.choice(MEASUREMENT_TYPES), sort_number=i)
+        for i in range(subjects)
+    ])
+    subject_ids = list(Subject.objects.values_list('pk', flat=True))
+
+    SubjectService.objects.bulk_create([
+        SubjectService(subject_id=subject_id, service_id=service_id, price=rnd.randint(50, 1500),
+                       duration=rnd.randint(3, 60))
+        for subject_id in subject_ids
+        for service_id in rnd.sample(service_ids, rnd.randint(1, min(4, len(service_ids))))
+    ])
+
+
+def create_payment_methods():
+    PaymentMethod.objects.bulk_create([
+        PaymentMethod(name=name, description=name, icon='card', icon_url='catalog/payment-methods/%d.svg' % i,
+                      prepayed=prepayed, confirmation_type='redirect' if prepayed else 'not', enabled=True)
+        for i, (name, prepayed) in enumerate(PAYMENT_METHODS)
+    ])
+
+
+def create_clients(count):
+    return [Client.objects.create(phone='+7900%07d' % i, first_name='Клиент %d' % i) for i in range(count)]
+
+
+def create_carts(rnd, count, max_units=8):
+    subject_service_ids = list(SubjectService.objects.values_list('pk', flat=True))
+
+    Cart.objects.bulk_create([Cart() for i in range(count)])
+    cart_ids = list(Cart.objects.order_by('-pk').values_list('pk', flat=True)[:count])[::-1]
+
+    sizes = [rnd.randint(1, max_units) for cart_id in cart_ids]
+    CartUnit.objects.bulk_create([
+        CartUnit(subject_service_id=rnd.choice(subject_service_ids), units_count=rnd.choice((0.5, 1, 1, 2, 3, 5)))
+        for i in range(sum(sizes))
+    ])
+    unit_ids = iter(list(CartUnit.objects.order_by('-pk').values_list('pk', flat=True)[:sum(sizes)])[::-1])
+
+    CartUnits = Cart.units.through
+    CartUnits.objects.bulk_create([
+        CartUnits(cart_id=cart_id, cartunit_id=next(unit_ids))
+        for cart_id, size in zip(cart_ids, sizes)
+        for i in range(size)
+    ])
+
+    return cart_ids
+
+
+def create_orders(rnd, clients, cart_ids, payment_method_ids, count, days=365, active_days=3, chunk_size=1000):
+    """
+    Creates an order history evenly spread over the given number of past days (older orders
+    have smaller pks) with a realistic share of finished and canceled orders. As in production,
+    only orders of the last active_days days are still in progress and occupy processing capacity.
+    """
+    finished = ['DELIVERED'] * 10 + ['CANCELED']
+    recent = ['DELIVERED'] * 20 + ['CANCELED'] * 8 + ['ISSUED', 'WAITING', 'ACCEPTED', 'PROCESSING'] * 18
+    now = timezone.now()
+
+    for offset in range(0, count, chunk_size):
+        orders = Order.bulk_checkout(rnd.choice(clients), [
+            {
+                'cart': rnd.choice(cart_ids),
+                'payment_method': rnd.choice(payment_method_ids),
+                'delivery_lat': 54.95 + rnd.random() * 0.1,
+                'delivery_long': 82.9 + rnd.random() * 0.2,
+                'delivery_address': 'Новосибирск, улица Тестовая, %d' % rnd.randint(1, 200),
+            }
+            for i in range(min(chunk_size, count - offset))
+        ])
+
+        groups = defaultdict(list)
+        for index, pk in enumerate(sorted(order.pk for order in orders), offset):
+            day = days - 1 - index * days // count
+            groups[(day, rnd.choice(recent if day < active_days else finished))].append(pk)
+
+        for (day, status), group in groups.items():
+            Order.objects.filter(pk__in=group).update(date_created=now - datetime.timedelta(days=day), status=status)
+
+
+def generate(size, seed=1):
+    """
+    Fills the database with a data set of the given size and returns a dict with
+    ids which benchmark cases need.
+    """
+    params = SIZES[size]
+    rnd = random.Random(seed)
+
+    create_catalog(rnd, params['categories'], params['subjects'], params['services'])
+    create_payment_methods()
+    clients = create_clients(params['clients'])
+    cart_ids = create_carts(rnd, params['carts'])
+    payment_method_ids = list(PaymentMethod.objects.values_list('pk', flat=True))
+
+    create_orders(rnd, clients, cart_ids, payment_method_ids, params['orders'])
+
+    return {
+        'clients': clients,
+        'cart_ids': cart_ids,
+        'payment_method_ids': payment_method_ids,
+        'subject_ids': list(Subject.objects.values_list('pk', flat=True)),
+    }
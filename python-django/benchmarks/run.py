@@ -0,0 +1,233 @@
+"""
+Benchmarks of checkout, catalog and geolocation hot paths.
+
+    python -m benchmarks.run --sizes small medium --output benchmarks/results/current.json
+    python -m benchmarks.compare benchmarks/results/baseline.json benchmarks/results/current.json
+
+Every size gets a fresh test database filled by benchmarks.fixtures; geolocation cases
+are served by the local 2GIS stub. For every case latency percentiles, throughput and
+the number of SQL queries per call are written to a JSON file.
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import time
+
+import django
+
+from benchmarks.stats import summarize
+
+# Orders created by one call of every checkout case (order_save, batch_10 and batch_50)
+ORDERS_PER_ROUND = 1 + 10 + 50
+
+
+def measure(func, iterations, warmup):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    for i in range(warmup):
+        func()
+
+    # Queries are counted in a separate pass, so that capturing does not affect timings
+    with CaptureQueriesContext(connection) as context:
+        func()
+    queries = len(context.captured_queries)
+
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+
+    result = summarize(latencies, elapsed)
+    result['queries'] = queries
+    return result
+
+
+def render(response):
+    if hasattr(response, 'render'):
+        response.render()
+    assert response.status_code < 400, response.content[:500]
+    return response
+
+
+def build_cases(data, rnd):
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    from cleaning.models import Order, Subject, PaymentMethod
+    from api_v0 import views, geolocation, checkout
+
+    factory = APIRequestFactory()
+    client = data['clients'][0]
+    payment_methods = {method.pk: method for method in PaymentMethod.objects.all()}
+    order_ids = list(Order.objects.order_by('-pk').values_list('pk', flat=True)[:1000])
+    subjects = list(Subject.objects.all())
+
+    def order_data():
+        return {
+            'cart': rnd.choice(data['cart_ids']),
+            'payment_method': rnd.choice(data['payment_method_ids']),
+            'delivery_lat': 55.0,
+            'delivery_long': 82.9,
+            'delivery_address': 'Новосибирск, улица Тестовая, 1',
+        }
+
+    def order_save():
+        item = order_data()
+        Order(owner=client, cart_id=item['cart'], payment_method=payment_methods[item['payment_method']],
+              delivery_lat=item['delivery_lat'], delivery_long=item['delivery_long'],
+              delivery_address=item['delivery_address']).save()
+
+    def calculate_summary():
+        Order.objects.get(pk=rnd.choice(order_ids)).calculate_summary()
+
+    def subject_min_price():
+        rnd.choice(subjects).min_price()
+
+    def batch_checkout(count):
+        def case():
+            request = factory.post('/', {'orders': [order_data() for i in range(count)]}, format='json')
+            force_authenticate(request, user=client)
+            render(checkout.batch_checkout(request))
+        return case
+
+    def catalog_list(viewset):
+        view = viewset.as_view({'get': 'list'})
+
+        def case():
+            render(view(factory.get('/')))
+        return case
+
+    def geolocation_view(view, body, compact):
+        def case():
+            request = factory.post('/?view=compact' if compact else '/', body, format='json')
+            force_authenticate(request, user=client)
+            render(view(request))
+        return case
+
+    return [
+        ('checkout.order_save', order_save),
+        ('checkout.calculate_summary', calculate_summary),
+        ('checkout.batch_10', batch_checkout(10)),
+        ('checkout.batch_50', batch_checkout(50)),
+        ('catalog.subject_min_price', subject_min_price),
+        ('catalog.categories', catalog_list(views.CategoryViewSet)),
+        ('catalog.subjects', catalog_list(views.SubjectViewSet)),
+        ('catalog.services', catalog_list(views.ServiceViewSet)),
+        ('catalog.subject_services', catalog_list(views.SubjectServiceViewSet)),
+        ('catalog.payment_methods', catalog_list(views.PaymentMethodViewSet)),
+        ('geolocation.get_coords', geolocation_view(geolocation.get_coords, {'query': 'Тестовая 1'}, False)),
+        ('geolocation.get_coords_compact', geolocation_view(geolocation.get_coords, {'query': 'Тестовая 1'}, True)),
+        ('geolocation.get_address', geolocation_view(geolocation.get_address, {'lat': 55.0, 'lon': 82.9}, False)),
+        ('geolocation.get_address_compact',
+         geolocation_view(geolocation.get_address, {'lat': 55.0, 'lon': 82.9}, True)),
+    ]
+
+
+def daily_capacity(cart_ids, calls, minimum):
+    """
+    Returns processing capacity per day with which active orders of the fixtures and all
+    orders created by the checkout cases fill at most half of the calendar horizon, so that
+    the cases measure scheduling and not the CalendarOverflow path.
+    """
+    from cleaning import scheduler
+    from cleaning.models import Order
+
+    minutes = scheduler.carts_minutes(cart_ids)
+    mean = sum(minutes.values()) / float(len(minutes))
+    active = Order.objects.exclude(status__in=scheduler.RELEASED_STATUSES).count()
+    load = mean * (active + calls * ORDERS_PER_ROUND)
+    return max(minimum, int(math.ceil(load * 2 / scheduler.CALENDAR_HORIZON_DAYS)))
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD']).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--settings', default=os.environ.get('DJANGO_SETTINGS_MODULE', 'symphony.settings'))
+    parser.add_argument('--sizes', nargs='+', default=['small', 'medium'], help='small, medium, large')
+    parser.add_argument('--cases', nargs='*', default=None, help='Префиксы имен замеряемых случаев')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--keepdb', action='store_true')
+    parser.add_argument('--output', default=None, help='Путь к JSON-файлу с результатами')
+    args = parser.parse_args()
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = args.settings
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.utils import setup_test_environment, setup_databases, teardown_databases
+
+    from benchmarks import fixtures
+    from benchmarks.stub_2gis import start_stub_server
+    from api_v0 import geolocation
+    from cleaning import scheduler
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False, keepdb=args.keepdb)
+    stub, geolocation.MAPS_2GIS_API_URL = start_stub_server()
+
+    configured_capacity = scheduler.DAILY_CAPACITY_MINUTES
+    # The calendar is rebuilt once per size, not in the middle of a measured case
+    scheduler.CALENDAR_REFRESH_SECONDS = None
+    results = []
+    try:
+        for size in args.sizes:
+            call_command('flush', interactive=False, verbosity=0)
+            data = fixtures.generate(size, args.seed)
+            scheduler.DAILY_CAPACITY_MINUTES = daily_capacity(data['cart_ids'], args.iterations + args.warmup + 1,
+                                                              configured_capacity)
+            scheduler.rebuild_calendar()
+
+            for name, case in build_cases(data, random.Random(args.seed)):
+                if args.cases and not any(name.startswith(prefix) for prefix in args.cases):
+                    continue
+
+                result = measure(case, args.iterations, args.warmup)
+                result.update(size=size, case=name)
+                results.append(result)
+                print('%-8s %-36s p50=%8.2fms p95=%8.2fms p99=%8.2fms %8.1f rps %4d queries' % (
+                    size, name, result['p50_ms'], result['p95_ms'], result['p99_ms'],
+                    result['throughput_rps'], result['queries']))
+    finally:
+        stub.shutdown()
+        teardown_databases(old_config, verbosity=0, keepdb=args.keepdb)
+
+    report = {
+        'meta': {
+            'date': datetime.datetime.now().isoformat(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': args.iterations,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Benchmarks of delivery date scheduling for peak-day order volumes.
+
+By default a stream of new orders (and a share of cancellations) is run against
+LoadCalendar alone:
+
+    python -m benchmarks.scheduler_benchmark --orders 50000 --days 365
+
+With --database orders of a peak day are checked out in batches against a fresh test
+database filled by benchmarks.fixtures, and `schedule_orders` is timed including its
+queries and the reservation after commit. A rebuild of the calendar from the database,
+i.e. a rescan of all active orders, is timed every --rebuild-every batches for comparison:
+
+    python -m benchmarks.scheduler_benchmark --database --size medium --orders 5000 --batch 10
+"""
+import argparse
+import datetime
+import math
+import os
+import random
+import time
+
+from benchmarks.stats import percentile
+from cleaning.load_calendar import LoadCalendar, CalendarOverflow
+
+
+def run(orders, days, capacity, cancel_share, seed):
+    random.seed(seed)
+    today = datetime.date.today()
+    calendar = LoadCalendar(today, days, capacity)
+
+    reserve_times, release_times = [], []
+    active = []
+
+    for pk in range(1, orders + 1):
+        minutes = random.randint(5, 240)
+
+        started = time.perf_counter()
+        try:
+            calendar.reserve(pk, minutes, today)
+        except CalendarOverflow:
+            break
+        reserve_times.append(time.perf_counter() - started)
+        active.append(pk)
+
+        if random.random() < cancel_share:
+            key = active.pop(random.randrange(len(active)))
+            started = time.perf_counter()
+            calendar.release(key)
+            release_times.append(time.perf_counter() - started)
+
+    return {
+        'orders': len(reserve_times),
+        'reserve': reserve_times,
+        'release': release_times,
+    }
+
+
+def run_database(settings, size, orders, batch, capacity, fill_days, rebuild_every, seed):
+    import django
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = settings
+    django.setup()
+
+    from django.db import connection, transaction
+    from django.test.utils import (setup_test_environment, setup_databases, teardown_databases,
+                                   CaptureQueriesContext)
+
+    from benchmarks import fixtures
+    from cleaning import scheduler
+    from cleaning.models import Order
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        data = fixtures.generate(size, seed)
+        rnd = random.Random(seed)
+        client = data['clients'][0]
+
+        if capacity is None:
+            minutes = scheduler.carts_minutes(data['cart_ids'])
+            capacity = int(math.ceil(sum(minutes.values()) / float(len(minutes)) * orders / fill_days))
+
+        # Rebuilds are made only by the benchmark
+        scheduler.DAILY_CAPACITY_MINUTES = capacity
+        scheduler.CALENDAR_REFRESH_SECONDS = None
+
+        def checkout():
+            return Order.bulk_checkout(client, [
+                {
+                    'cart': rnd.choice(data['cart_ids']),
+                    'payment_method': rnd.choice(data['payment_method_ids']),
+                    'delivery_lat': 55.0,
+                    'delivery_long': 82.9,
+                    'delivery_address': 'Новосибирск, улица Тестовая, 1',
+                }
+                for i in range(batch)
+            ])
+
+        def rebuild():
+            started = time.perf_counter()
+            scheduler.rebuild_calendar()
+            return time.perf_counter() - started
+
+        schedule_times, rebuild_times = [], [rebuild()]
+        with CaptureQueriesContext(connection) as context:
+            with transaction.atomic():
+                scheduler.schedule_orders(checkout())
+        queries = len(context.captured_queries)
+
+        for index in range(1, orders // batch):
+            created = checkout()
+
+            started = time.perf_counter()
+            with transaction.atomic():
+                scheduler.schedule_orders(created)
+            schedule_times.append(time.perf_counter() - started)
+
+            if index % rebuild_every == 0:
+                rebuild_times.append(rebuild())
+
+        return {
+            'orders': len(schedule_times) * batch,
+            'capacity': capacity,
+            'active': len(scheduler.get_calendar()),
+            'queries': queries,
+            'database': connection.vendor,
+            'schedule': schedule_times,
+            'rebuild': rebuild_times,
+        }
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=50000, help='Количество заказов')
+    parser.add_argument('--days', type=int, default=365, help='Горизонт календаря в днях')
+    parser.add_argument('--capacity', type=int, default=None,
+                        help='Мощность обработки в минутах в день (по умолчанию 4800, с --database '
+                             'подбирается так, чтобы заказы заняли --fill-days дней)')
+    parser.add_argument('--cancel-share', type=float, default=0.05, help='Доля отмененных заказов')
+    parser.add_argument('--database', action='store_true', help='Замерять schedule_orders с базой данных')
+    parser.add_argument('--settings', default=os.environ.get('DJANGO_SETTINGS_MODULE', 'symphony.settings'))
+    parser.add_argument('--size', default='medium', help='Размер данных benchmarks.fixtures')
+    parser.add_argument('--batch', type=int, default=10, help='Количество заказов в одном оформлении')
+    parser.add_argument('--fill-days', type=int, default=3, help='Сколько дней занимают заказы пикового дня')
+    parser.add_argument('--rebuild-every', type=int, default=50, help='Замерять пересборку каждые N оформлений')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.database:
+        result = run_database(args.settings, args.size, args.orders, args.batch, args.capacity, args.fill_days,
+                              args.rebuild_every, args.seed)
+        print('orders: %d, active: %d, capacity: %d min/day, %s, %d queries per schedule_orders' % (
+            result['orders'], result['active'], result['capacity'], result['database'], result['queries']))
+        names = ('schedule', 'rebuild')
+    else:
+        result = run(args.orders, args.days, args.capacity or 4800, args.cancel_share, args.seed)
+        print('orders: %d' % result['orders'])
+        names = ('reserve', 'release')
+
+    for name in names:
+        values = result[name]
+        if not values:
+            continue
+        print('%-15s p50=%8.1fus  p95=%8.1fus  p99=%8.1fus' % (
+            name,
+            percentile(values, 50) * 1e6,
+            percentile(values, 95) * 1e6,
+            percentile(values, 99) * 1e6,
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""
+Latency statistics shared by benchmarks and load tests.
+"""
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def summarize(latencies, elapsed):
+    """
+    Returns latency percentiles (in milliseconds) and throughput of a series of calls
+    which took `elapsed` seconds of wall time in total.
+    """
+    if not latencies:
+        return {'count': 0}
+
+    latencies = sorted(latencies)
+    return {
+        'count': len(latencies),
+        'mean_ms': sum(latencies) * 1000.0 / len(latencies),
+        'p50_ms': percentile(latencies, 50) * 1000.0,
+        'p90_ms': percentile(latencies, 90) * 1000.0,
+        'p95_ms': percentile(latencies, 95) * 1000.0,
+        'p99_ms': percentile(latencies, 99) * 1000.0,
+        'max_ms': latencies[-1] * 1000.0,
+        'throughput_rps': len(latencies) / elapsed if elapsed else 0,
+    }
@@ -0,0 +1,128 @@
+"""
+Local stub of the 2GIS catalog API for benchmarks and load tests.
+
+    python -m benchmarks.stub_2gis --port 8099 --latency 40
+
+Answers every GET with `page_size` items in the shape of the real API,
+with polygon selections (every fifth item is a street with a line selection),
+after an optional artificial latency.
+"""
+import argparse
+import json
+import math
+import random
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def polygon_wkt(lon, lat, vertices=24, radius=0.0004):
+    points = []
+    for i in range(vertices):
+        angle = 2 * math.pi * i / vertices
+        points.append('%.6f %.6f' % (lon + radius * math.cos(angle), lat + radius * math.sin(angle)))
+    points.append(points[0])
+    return 'POLYGON((%s))' % ', '.join(points)
+
+
+def line_wkt(lon, lat, segments=6, step=0.0008):
+    points = ['%.6f %.6f' % (lon + step * i, lat + step * (i % 2) / 4) for i in range(segments + 1)]
+    return 'LINESTRING(%s)' % ', '.join(points)
+
+
+def build_response(page_size, seed=0):
+    rnd = random.Random(seed)
+    items = []
+    for i in range(page_size):
+        lon = 82.9 + rnd.random() * 0.2
+        lat = 54.95 + rnd.random() * 0.1
+        if i % 5 == 4:
+            street = 'улица Тестовая %d' % (i + 1)
+            items.append({
+                'id': '%d' % (141265770000000 + i),
+                'type': 'street',
+                'name': street,
+                'full_name': 'Новосибирск, %s' % street,
+                'address_name': '',
+                'geometry': {'selection': line_wkt(lon, lat)},
+            })
+            continue
+
+        street = 'улица Тестовая, %d' % (i + 1)
+        items.append({
+            'id': '%d' % (141265770000000 + i),
+            'type': 'building',
+            'name': street,
+            'full_name': 'Новосибирск, %s' % street,
+            'address_name': street,
+            'purpose_name': 'Жилой дом',
+            'building_name': '',
+            'geometry': {'selection': polygon_wkt(lon, lat)},
+        })
+
+    return {
+        'meta': {'api_version': '2.0.0', 'code': 200, 'issue_date': '20190101'},
+        'result': {'items': items, 'total': page_size * 4},
+    }
+
+
+class Stub2GISHandler(BaseHTTPRequestHandler):
+    latency = 0
+    cache = {}
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        page_size = int(params.get('page_size', ['15'])[0])
+
+        if page_size not in self.cache:
+            self.cache[page_size] = json.dumps(build_response(page_size), ensure_ascii=False).encode('utf-8')
+        body = self.cache[page_size]
+
+        if self.latency:
+            time.sleep(self.latency / 1000.0)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def start_stub_server(port=0, latency=0):
+    """
+    Starts the stub in a background thread and returns (server, url).
+    """
+    handler = type('Handler', (Stub2GISHandler,), {'latency': latency, 'cache': {}})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, 'http://127.0.0.1:%d/3.0/items' % server.server_address[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0, help='Искусственная задержка ответа в мс')
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.port, args.latency)
+    print('2GIS stub: %s' % url)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+from django.db import transaction
+from rest_framework import serializers, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from cleaning.models import Order, Cart, PaymentMethod
+from cleaning.scheduler import schedule_orders
+from cleaning.rollups import record_orders
+
+MAX_BATCH_ORDERS = 100
+
+
+class BatchOrderItemSerializer(serializers.Serializer):
+    cart = serializers.IntegerField(min_value=1)
+    payment_method = serializers.IntegerField(min_value=1)
+    delivery_lat = serializers.FloatField()
+    delivery_long = serializers.FloatField()
+    delivery_address = serializers.CharField(max_length=255)
+
+
+class BatchOrderSerializer(serializers.Serializer):
+    orders = BatchOrderItemSerializer(many=True, allow_empty=False)
+
+    def validate_orders(self, orders):
+        if len(orders) > MAX_BATCH_ORDERS:
+            raise serializers.ValidationError('Нельзя оформить более %d заказов за один раз' % MAX_BATCH_ORDERS)
+
+        carts = set(Cart.objects.filter(pk__in=[item['cart'] for item in orders]).values_list('pk', flat=True))
+        payment_methods = set(PaymentMethod.objects.filter(
+            pk__in=[item['payment_method'] for item in orders], enabled=True).values_list('pk', flat=True))
+
+        errors = []
+        for item in orders:
+            item_errors = {}
+            if item['cart'] not in carts:
+                item_errors['cart'] = ['Корзина #%d не найдена' % item['cart']]
+            if item['payment_method'] not in payment_methods:
+                item_errors['payment_method'] = ['Способ оплаты #%d недоступен' % item['payment_method']]
+            errors.append(item_errors)
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        return orders
+
+
+@api_view(['POST'])
+@permission_classes((IsAuthenticated,))
+def batch_checkout(request):
+    serializer = BatchOrderSerializer(data=request.data)
+
+    if serializer.is_valid():
+        with transaction.atomic():
+            orders = Order.bulk_checkout(request.user, serializer.validated_data.get('orders'))
+            schedule_orders(orders)
+            record_orders(orders)
+
+        data = [
+            {
+                'id': order.pk,
+                'cart': order.cart_id,
+                'delivery_price': order.delivery_price,
+                'total': order.total,
+                'status': order.status,
+                'delivery_date': order.delivery_date,
+            }
+            for order in orders
+        ]
+
+        return Response(data={'orders': data}, status=status.HTTP_201_CREATED)
+
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
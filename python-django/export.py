@@ -0,0 +1,151 @@
+import csv
+import json
+from collections import defaultdict
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from cleaning.models import Order, CartUnit
+from cleaning.replicas import run_on_replica
+
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_FIELDS = (
+    'id', 'date_created', 'status', 'owner', 'payment_method', 'delivery_address',
+    'delivery_date', 'delivery_price', 'total', 'payment_check', 'items',
+)
+
+# Spreadsheets evaluate cells starting with these characters as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def filter_orders(date_from=None, date_to=None, statuses=None):
+    orders = Order.objects.all()
+    if date_from:
+        orders = orders.filter(date_created__date__gte=date_from)
+    if date_to:
+        orders = orders.filter(date_created__date__lte=date_to)
+    if statuses:
+        orders = orders.filter(status__in=statuses)
+    return orders
+
+
+def fetch_chunk(orders, last_pk, chunk_size):
+    """
+    Returns the next chunk of orders after last_pk and {cart_id: items} of their carts.
+    """
+    chunk = list(orders.filter(pk__gt=last_pk)[:chunk_size])
+
+    items = defaultdict(list)
+    if chunk:
+        units = CartUnit.objects.filter(cart__in={order.cart_id for order in chunk}).values_list(
+            'cart', 'subject_service__subject__name', 'subject_service__service__name',
+            'units_count', 'subject_service__price')
+        for cart_id, subject, service, units_count, price in units:
+            items[cart_id].append({
+                'subject': subject,
+                'service': service,
+                'units_count': units_count,
+                'price': price,
+            })
+
+    return chunk, items
+
+
+def iter_orders(orders, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields export rows of the orders. Orders are fetched in pk-ordered chunks with owner and
+    payment method joined and cart lines loaded by one query per chunk, so memory use
+    does not depend on the number of exported orders.
+    """
+    orders = orders.select_related('owner', 'payment_method').order_by('pk')
+    last_pk = 0
+
+    while True:
+        chunk, items = run_on_replica(fetch_chunk, orders, last_pk, chunk_size)
+        if not chunk:
+            return
+
+        for order in chunk:
+            yield {
+                'id': order.pk,
+                'date_created': timezone.localtime(order.date_created).isoformat(),
+                'status': order.status,
+                'owner': order.owner.phone,
+                'payment_method': order.payment_method.name if order.payment_method else '',
+                'delivery_address': order.delivery_address,
+                'delivery_date': timezone.localtime(order.delivery_date).isoformat() if order.delivery_date else '',
+                'delivery_price': order.delivery_price,
+                'total': order.total,
+                'payment_check': order.payment_check,
+                'items': items[order.cart_id],
+            }
+
+        last_pk = chunk[-1].pk
+
+
+class Echo(object):
+    def write(self, value):
+        return value
+
+
+def csv_cell(value):
+    """
+    Escapes user-entered text which would be evaluated as a formula when the export is opened.
+    """
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        row['items'] = '; '.join('%(subject)s / %(service)s x %(units_count)s' % item for item in row['items'])
+        yield writer.writerow([csv_cell(row[field]) for field in EXPORT_FIELDS])
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+WRITERS = {
+    'csv': iter_csv,
+    'ndjson': iter_ndjson,
+}
+
+
+class OrderExportSerializer(serializers.Serializer):
+    export_format = serializers.ChoiceField(choices=list(WRITERS.keys()), default='csv')
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    status = serializers.MultipleChoiceField(choices=Order.ORDER_STATUSES, required=False)
+
+
+@api_view(['GET'])
+@permission_classes((IsAdminUser,))
+def export_orders(request):
+    serializer = OrderExportSerializer(data=request.query_params)
+
+    if serializer.is_valid():
+        data = serializer.validated_data
+        export_format = data.get('export_format')
+        orders = filter_orders(data.get('date_from'), data.get('date_to'), data.get('status'))
+
+        response = StreamingHttpResponse(WRITERS[export_format](iter_orders(orders)),
+                                         content_type=CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = 'attachment; filename="orders.%s"' % export_format
+        return response
+
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -1,15 +1,140 @@
+import re
+
 import requests
 import json
 
+from django.http import HttpResponse
+from django.views.decorators.gzip import gzip_page
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from api_v0.serializers.maps_2gis_serializers import GeoObjectSerializer, CoordsSerializer
+from cleaning.instrumentation import upstream_call
 from symphony.settings import MAPS_2GIS_API_URL, MAPS_2GIS_API_KEY
 
+# Keep-alive connections to 2GIS are reused between requests
+session = requests.Session()
+
+GEOMETRY_TYPE = re.compile(r'\s*([A-Za-z]+)')
+POLYGON_RING = re.compile(r'\(\(([^()]+)\)')
+COORDINATES = re.compile(r'\(([^()]+)\)')
+
+
+def parse_ring(text):
+    return [tuple(float(value) for value in pair.split()[:2]) for pair in text.split(',')]
+
+
+def ring_centroid(ring):
+    """
+    Returns (area, x, y) of a polygon ring using the shoelace formula.
+    Coordinates are shifted to the first vertex to keep precision.
+    """
+    ox, oy = ring[0]
+    ring = [(x - ox, y - oy) for x, y in ring]
+    area = cx = cy = 0
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+        cross = x1 * y2 - x2 * y1
+        area += cross
+        cx += (x1 + x2) * cross
+        cy += (y1 + y2) * cross
+
+    area /= 2.0
+    if not area:
+        return 0, ox + sum(x for x, y in ring) / len(ring), oy + sum(y for x, y in ring) / len(ring)
+
+    return abs(area), ox + cx / (6 * area), oy + cy / (6 * area)
+
+
+def lines_centroid(lines):
+    """
+    Returns (lon, lat) of lines as midpoints of their segments weighted by segment length.
+    """
+    length = cx = cy = 0
+    for line in lines:
+        for (x1, y1), (x2, y2) in zip(line, line[1:]):
+            segment = ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5
+            length += segment
+            cx += segment * (x1 + x2) / 2.0
+            cy += segment * (y1 + y2) / 2.0
+
+    if not length:
+        return lines[0][0]
+
+    return cx / length, cy / length
+
+
+def polygons_centroid(rings):
+    centroids = [ring_centroid(ring) for ring in rings]
+    area = sum(centroid[0] for centroid in centroids)
+    if not area:
+        return centroids[0][1], centroids[0][2]
+
+    return (sum(a * x for a, x, y in centroids) / area,
+            sum(a * y for a, x, y in centroids) / area)
+
+
+def wkt_centroid(wkt):
+    """
+    Returns (lon, lat) centroid of POINT, LINESTRING, POLYGON WKT or their MULTI variants
+    (outer rings only), or None for empty and other geometries.
+    """
+    geometry_type = GEOMETRY_TYPE.match(wkt)
+    geometry_type = geometry_type.group(1).upper() if geometry_type else None
+
+    if geometry_type in ('POLYGON', 'MULTIPOLYGON'):
+        rings = [parse_ring(ring) for ring in POLYGON_RING.findall(wkt)]
+        return polygons_centroid(rings) if rings else None
+
+    parts = [parse_ring(part) for part in COORDINATES.findall(wkt)]
+    if not parts:
+        return None
+
+    if geometry_type == 'POINT':
+        return parts[0][0]
+
+    if geometry_type == 'MULTIPOINT':
+        points = [point for part in parts for point in part]
+        return sum(x for x, y in points) / len(points), sum(y for x, y in points) / len(points)
+
+    if geometry_type in ('LINESTRING', 'MULTILINESTRING'):
+        return lines_centroid(parts)
+
+    return None
+
+
+def compact_item(item):
+    selection = (item.get('geometry') or {}).get('selection')
+    centroid = wkt_centroid(selection) if selection else None
+
+    return {
+        'name': item.get('name') or item.get('full_name', ''),
+        'address': item.get('address_name') or item.get('full_name', ''),
+        'lat': centroid[1] if centroid else None,
+        'lon': centroid[0] if centroid else None,
+    }
+
+
+def maps_2gis_response(request, payload):
+    """
+    Relays the 2GIS response. Full responses are passed through without decoding;
+    with ?view=compact every item is projected to name, address and a point.
+    """
+    with upstream_call('2gis') as call:
+        upstream = session.get(MAPS_2GIS_API_URL, params=payload)
+        call.status = upstream.status_code
+
+    if upstream.status_code != requests.codes.ok or request.query_params.get('view') != 'compact':
+        return HttpResponse(upstream.content, content_type='application/json',
+                            status=status.HTTP_200_OK if upstream.status_code == requests.codes.ok
+                            else status.HTTP_400_BAD_REQUEST)
+
+    items = (json.loads(upstream.content).get('result') or {}).get('items', [])
+    return Response(data={'items': [compact_item(item) for item in items]}, status=status.HTTP_200_OK)
+
 
+@gzip_page
 @api_view(['POST'])
 @permission_classes((IsAuthenticated,))
 def get_coords(request):
@@ -26,15 +151,12 @@ def get_coords(request):
             'locale': 'ru_RU'
         }
 
-        request = requests.get(MAPS_2GIS_API_URL, params=payload)
-        if request.status_code == requests.codes.ok:
-            return Response(data=json.loads(request.text), status=status.HTTP_200_OK)
-        else:
-            return Response(data=json.loads(request.text), status=status.HTTP_400_BAD_REQUEST)
+        return maps_2gis_response(request, payload)
 
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@gzip_page
 @api_view(['POST'])
 @permission_classes((IsAuthenticated,))
 def get_address(request):
@@ -52,10 +174,6 @@ def get_address(request):
             'locale': 'ru_RU'
         }
 
-        request = requests.get(MAPS_2GIS_API_URL, params=payload)
-        if request.status_code == requests.codes.ok:
-            return Response(data=json.loads(request.text), status=status.HTTP_200_OK)
-        else:
-            return Response(data=json.loads(request.text), status=status.HTTP_400_BAD_REQUEST)
+        return maps_2gis_response(request, payload)
 
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
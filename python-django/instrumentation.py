@@ -0,0 +1,289 @@
+"""
+Per-view instrumentation: SQL query count and time, serialization time, upstream HTTP time
+and total latency are collected into in-process histograms and exposed in the Prometheus
+text format by the `metrics` view.
+
+Settings:
+
+    MIDDLEWARE = ['cleaning.instrumentation.InstrumentationMiddleware'] + MIDDLEWARE
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = ('cleaning.instrumentation.InstrumentedJSONRenderer', ...)
+    INSTRUMENTATION_SLOW_REQUEST_MS = 500    # None disables the slow request sampler
+    INSTRUMENTATION_SLOW_SAMPLE_RATE = 0.1   # share of requests for which SQL is captured
+
+Serialization is measured while JSON is rendered and, for generic views with
+MeasuredSerializerMixin, while `serializer.data` is built. Queries issued while building
+`data` (lazy querysets, related fields) are additionally counted as serialization SQL;
+they are still included in the per-view SQL totals.
+
+Histograms are kept per process, so every worker exposes its own metrics.
+"""
+import bisect
+import random
+import threading
+import time
+from collections import deque, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, JsonResponse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import JSONRenderer
+
+SLOW_REQUEST_MS = getattr(settings, 'INSTRUMENTATION_SLOW_REQUEST_MS', None)
+SLOW_SAMPLE_RATE = getattr(settings, 'INSTRUMENTATION_SLOW_SAMPLE_RATE', 0.1)
+SLOW_REQUESTS_KEPT = 100
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_state = threading.local()
+
+
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.sum
+
+
+class Registry(object):
+    """
+    Named histograms and counters with label values.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def histogram(self, name, labels, buckets=DURATION_BUCKETS):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram(buckets))
+        return histogram
+
+    def increment(self, name, labels):
+        with self.lock:
+            self.counters[(name, labels)] += 1
+
+    def exposition(self):
+        lines = []
+        previous = None
+        for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+            if name != previous:
+                lines.append('# TYPE %s histogram' % name)
+                previous = name
+
+            counts, total = histogram.snapshot()
+            label_text = ','.join('%s="%s"' % pair for pair in labels)
+            accumulated = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), counts):
+                accumulated += count
+                lines.append('%s_bucket{%s,le="%s"} %d' % (name, label_text, bound, accumulated))
+            lines.append('%s_sum{%s} %f' % (name, label_text, total))
+            lines.append('%s_count{%s} %d' % (name, label_text, accumulated))
+
+        with self.lock:
+            counters = sorted(self.counters.items())
+        for (name, labels), value in counters:
+            if name != previous:
+                lines.append('# TYPE %s counter' % name)
+                previous = name
+            lines.append('%s{%s} %d' % (name, ','.join('%s="%s"' % pair for pair in labels), value))
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+slow_requests = deque(maxlen=SLOW_REQUESTS_KEPT)
+
+
+class RequestRecord(object):
+    __slots__ = ('sql_count', 'sql_time', 'serialize_time', 'serialize_sql_count', 'serialize_sql_time',
+                 'upstream_time', 'queries', 'serializing')
+
+    def __init__(self, capture_queries):
+        self.sql_count = 0
+        self.sql_time = 0
+        self.serialize_time = 0
+        self.serialize_sql_count = 0
+        self.serialize_sql_time = 0
+        self.serializing = False
+        self.upstream_time = 0
+        self.queries = [] if capture_queries else None
+
+
+def current_record():
+    return getattr(_state, 'record', None)
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        record = current_record()
+        if record is not None:
+            record.sql_count += 1
+            record.sql_time += duration
+            if record.serializing:
+                record.serialize_sql_count += 1
+                record.serialize_sql_time += duration
+            if record.queries is not None:
+                record.queries.append((sql, round(duration * 1000, 3)))
+
+
+@contextmanager
+def measure_serialization():
+    """
+    Measures serialization inside the block. Nested blocks are counted once.
+    """
+    record = current_record()
+    if record is None or record.serializing:
+        yield
+        return
+
+    record.serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record.serializing = False
+        record.serialize_time += time.perf_counter() - started
+
+
+class MeasuredSerializer(object):
+    """
+    Wrapper of a serializer which measures building of `data` as serialization.
+    Everything else is delegated to the wrapped serializer.
+    """
+
+    def __init__(self, serializer):
+        self.serializer = serializer
+
+    @property
+    def data(self):
+        with measure_serialization():
+            return self.serializer.data
+
+    def __getattr__(self, name):
+        return getattr(self.serializer, name)
+
+
+class MeasuredSerializerMixin(object):
+    """
+    Generic view mixin which measures building of serializer `data`, including
+    evaluation of lazy querysets of list views.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        return MeasuredSerializer(super(MeasuredSerializerMixin, self).get_serializer(*args, **kwargs))
+
+
+class UpstreamCall(object):
+    status = 'error'
+
+
+@contextmanager
+def upstream_call(service):
+    """
+    Measures an HTTP call to an external service. Set `status` of the yielded object
+    to the response status code.
+    """
+    call = UpstreamCall()
+    started = time.perf_counter()
+    try:
+        yield call
+    finally:
+        duration = time.perf_counter() - started
+        registry.histogram('upstream_duration_seconds', (('service', service),)).observe(duration)
+        registry.increment('upstream_responses_total', (('service', service), ('status', str(call.status))))
+        record = current_record()
+        if record is not None:
+            record.upstream_time += duration
+
+
+class InstrumentedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with measure_serialization():
+            return super(InstrumentedJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+
+
+class InstrumentationMiddleware(object):
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        capture = SLOW_REQUEST_MS is not None and random.random() < SLOW_SAMPLE_RATE
+        record = _state.record = RequestRecord(capture)
+        wrapped = []
+        started = time.perf_counter()
+
+        try:
+            for connection in connections.all():
+                wrapper = connection.execute_wrapper(sql_wrapper)
+                wrapper.__enter__()
+                wrapped.append(wrapper)
+
+            response = self.get_response(request)
+        finally:
+            for wrapper in reversed(wrapped):
+                wrapper.__exit__(None, None, None)
+            _state.record = None
+
+        duration = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        labels = (('view', match.view_name if match else 'unresolved'),)
+
+        registry.histogram('request_duration_seconds', labels).observe(duration)
+        registry.histogram('sql_duration_seconds', labels).observe(record.sql_time)
+        registry.histogram('sql_queries', labels, COUNT_BUCKETS).observe(record.sql_count)
+        registry.histogram('serialize_duration_seconds', labels).observe(record.serialize_time)
+        registry.histogram('serialize_sql_duration_seconds', labels).observe(record.serialize_sql_time)
+        registry.histogram('serialize_sql_queries', labels, COUNT_BUCKETS).observe(record.serialize_sql_count)
+        registry.histogram('upstream_request_duration_seconds', labels).observe(record.upstream_time)
+
+        if record.queries is not None and duration * 1000 >= SLOW_REQUEST_MS:
+            slow_requests.append({
+                'view': labels[0][1],
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 3),
+                'sql_time_ms': round(record.sql_time * 1000, 3),
+                'serialize_time_ms': round(record.serialize_time * 1000, 3),
+                'serialize_sql_count': record.serialize_sql_count,
+                'serialize_sql_time_ms': round(record.serialize_sql_time * 1000, 3),
+                'upstream_time_ms': round(record.upstream_time * 1000, 3),
+                'queries': record.queries,
+            })
+
+        return response
+
+
+@api_view(['GET'])
+@permission_classes((IsAdminUser,))
+def metrics(request):
+    return HttpResponse(registry.exposition(), content_type='text/plain; version=0.0.4')
+
+
+@api_view(['GET'])
+@permission_classes((IsAdminUser,))
+def slow_requests_log(request):
+    return JsonResponse({'requests': list(slow_requests)})
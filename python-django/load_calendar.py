@@ -0,0 +1,141 @@
+import datetime
+import threading
+
+
+class CalendarOverflow(Exception):
+    pass
+
+
+class LoadCalendar(object):
+    """
+    In-memory calendar of processing capacity (in minutes per day).
+
+    Free minutes of every day are kept in a Fenwick tree, so the earliest day on which
+    an order of a given load can be finished is found in O(log n) of the horizon length.
+    Reservations are remembered per order so they can be released on status change.
+    """
+
+    def __init__(self, origin, days, capacity):
+        self.origin = origin
+        self.days = days
+        self.capacity = capacity
+        self.used = [0] * days
+        self.allocations = {}
+        self.lock = threading.RLock()
+
+        self.tree = [0] * (days + 1)
+        for i in range(1, days + 1):
+            self.tree[i] += capacity
+            parent = i + (i & -i)
+            if parent <= days:
+                self.tree[parent] += self.tree[i]
+
+        self.top_step = 1
+        while self.top_step * 2 <= days:
+            self.top_step *= 2
+
+    def day_index(self, date):
+        return (date - self.origin).days
+
+    def day_date(self, index):
+        return self.origin + datetime.timedelta(days=index)
+
+    def free(self, index):
+        return self.capacity - self.used[index]
+
+    def _add_free(self, index, delta):
+        i = index + 1
+        while i <= self.days:
+            self.tree[i] += delta
+            i += i & -i
+
+    def _free_before(self, index):
+        """Sum of free minutes of days [0, index)."""
+        result = 0
+        i = index
+        while i > 0:
+            result += self.tree[i]
+            i -= i & -i
+        return result
+
+    def _lower_bound(self, target):
+        """Smallest day index whose cumulative free minutes (inclusive) reach target."""
+        pos = 0
+        step = self.top_step
+        while step:
+            if pos + step <= self.days and self.tree[pos + step] < target:
+                pos += step
+                target -= self.tree[pos]
+            step //= 2
+        return pos
+
+    def find_day(self, minutes, not_before):
+        """Returns the index of the day on which a load of given minutes will be processed."""
+        start = max(self.day_index(not_before), 0)
+        if start >= self.days:
+            raise CalendarOverflow('Дата %s находится за горизонтом календаря' % not_before)
+
+        if minutes <= 0:
+            return start
+
+        index = self._lower_bound(self._free_before(start) + minutes)
+        if index >= self.days:
+            raise CalendarOverflow('Недостаточно мощностей для обработки %d мин.' % minutes)
+
+        return index
+
+    def reserve(self, key, minutes, not_before):
+        """Reserves capacity for the order with the given key and returns the finishing day."""
+        with self.lock:
+            self.release(key)
+
+            index = self.find_day(minutes, not_before)
+            allocation = []
+            remaining = minutes
+            free_before_start = self._free_before(max(self.day_index(not_before), 0))
+
+            # Full days are skipped by searching for the first day with free minutes left
+            while remaining > 0:
+                day = self._lower_bound(free_before_start + 1)
+                taken = min(self.free(day), remaining)
+                self.used[day] += taken
+                self._add_free(day, -taken)
+                allocation.append((day, taken))
+                remaining -= taken
+
+            self.allocations[key] = allocation
+            return self.day_date(index)
+
+    def plan(self, loads, not_before):
+        """
+        Returns finishing days of loads placed one after another (None for loads which
+        do not fit) without keeping the reservations.
+        """
+        with self.lock:
+            keys = []
+            days = []
+            try:
+                for load in loads:
+                    key = object()
+                    try:
+                        days.append(self.reserve(key, load, not_before))
+                    except CalendarOverflow:
+                        days.append(None)
+                    else:
+                        keys.append(key)
+            finally:
+                for key in keys:
+                    self.release(key)
+            return days
+
+    def release(self, key):
+        with self.lock:
+            for day, taken in self.allocations.pop(key, ()):
+                self.used[day] -= taken
+                self._add_free(day, taken)
+
+    def __contains__(self, key):
+        return key in self.allocations
+
+    def __len__(self):
+        return len(self.allocations)
@@ -0,0 +1,203 @@
+"""
+Scripted user journeys of the load test. Every journey is a sequence of HTTP calls made
+by one virtual user; a journey fails if any of its calls fails.
+"""
+import random
+import threading
+
+import requests
+
+DEFAULT_PATHS = {
+    'sms_code': '/api/v0/auth/sms/',
+    'sms_login': '/api/v0/auth/sms/verify/',
+    'categories': '/api/v0/categories/',
+    'subjects': '/api/v0/subjects/',
+    'subject_services': '/api/v0/subject-services/',
+    'payment_methods': '/api/v0/payment-methods/',
+    'get_coords': '/api/v0/geolocation/coords/',
+    'get_address': '/api/v0/geolocation/address/',
+    'carts': '/api/v0/carts/',
+    'orders': '/api/v0/orders/',
+    'driver_location': '/api/v0/drivers/location/',
+}
+
+ADDRESS_QUERIES = ('Красный проспект', 'улица Ленина', 'Октябрьская', 'улица Фрунзе', 'Большевистская')
+
+
+# Phones of fresh test users must not repeat between runs: a new SMS code for a phone
+# can be requested only SMSVerifier.code_expiration_time seconds after the previous one
+phone_random = random.SystemRandom()
+
+
+class JourneyError(Exception):
+    def __init__(self, message, kind=None):
+        super(JourneyError, self).__init__(message)
+        self.kind = kind or message
+
+
+def error_kind(exception):
+    """
+    Returns a short name of the failure for error statistics, e.g. 'orders: HTTP 500'.
+    """
+    if isinstance(exception, JourneyError):
+        return exception.kind
+    return type(exception).__name__
+
+
+def fresh_phone():
+    return '+7999%07d' % phone_random.randint(0, 9999999)
+
+
+class Context(object):
+    """
+    Shared state of virtual users: target URL, endpoint paths, auth tokens and
+    catalog ids loaded before the test. Without configured phones or tokens
+    `users` new users with fresh phones are logged in.
+    """
+
+    def __init__(self, base_url, paths=None, phones=(), driver_tokens=(), compact_geolocation=True, seed=None,
+                 tokens=(), users=20):
+        self.base_url = base_url.rstrip('/')
+        self.paths = dict(DEFAULT_PATHS, **(paths or {}))
+        self.phones = list(phones)
+        self.tokens = list(tokens)
+        self.users = users
+        self.driver_tokens = list(driver_tokens)
+        self.compact_geolocation = compact_geolocation
+        self.subject_service_ids = []
+        self.payment_method_ids = []
+        self.random = random.Random(seed)
+        self.local = threading.local()
+
+    @property
+    def session(self):
+        # requests.Session is not thread-safe, every worker thread gets its own
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        return session
+
+    def call(self, method, name, token=None, params=None, **kwargs):
+        headers = {'Accept-Encoding': 'gzip'}
+        if token:
+            headers['Authorization'] = 'Token %s' % token
+
+        try:
+            response = self.session.request(method, self.base_url + self.paths[name], headers=headers,
+                                            params=params, timeout=30, **kwargs)
+        except requests.RequestException as e:
+            raise JourneyError('%s: %s' % (name, e), '%s: %s' % (name, type(e).__name__))
+
+        if response.status_code >= 400:
+            raise JourneyError('%s: HTTP %d' % (name, response.status_code))
+
+        return response.json() if response.content else None
+
+    def prepare(self):
+        """
+        Logs in test users and loads ids which journeys need.
+        Raises JourneyError with the reason if the test cannot be run.
+        """
+        phones = self.phones
+        if not phones and not self.tokens:
+            phones = [fresh_phone() for i in range(self.users)]
+
+        for phone in phones:
+            try:
+                token = sms_login(self, phone)
+            except JourneyError as e:
+                raise JourneyError('Не удалось авторизовать %s: %s' % (phone, e))
+            if not token:
+                raise JourneyError('Не удалось авторизовать %s: токен не получен' % phone)
+            self.tokens.append(token)
+
+        if not self.tokens:
+            raise JourneyError('Нет токенов пользователей: укажите phones или tokens в конфигурации или users > 0')
+
+        subject_services = self.call('GET', 'subject_services')
+        payment_methods = self.call('GET', 'payment_methods')
+        self.subject_service_ids = [item['id'] for item in results(subject_services)]
+        self.payment_method_ids = [item['id'] for item in results(payment_methods)]
+
+        if not self.subject_service_ids or not self.payment_method_ids:
+            raise JourneyError('Каталог пуст: для оформления заказов нужны услуги и способы оплаты')
+
+
+def results(data):
+    return data['results'] if isinstance(data, dict) and 'results' in data else data
+
+
+def sms_login(context, phone=None):
+    phone = phone or fresh_phone()
+    data = context.call('POST', 'sms_code', json={'phone': phone})
+    if not data or not data.get('code'):
+        # The code is not returned when it was requested less than code_expiration_time ago
+        # or when the instance does not run in DEBUG mode
+        raise JourneyError('sms_code: код не получен (%s)' % ((data or {}).get('message') or
+                                                              'нужен DEBUG-режим с возвратом кода'),
+                           'sms_code: no code')
+
+    data = context.call('POST', 'sms_login', json={'phone': phone, 'code': data['code']})
+    return data.get('token') if data else None
+
+
+def browse_catalog(context):
+    context.call('GET', 'categories')
+    context.call('GET', 'subjects')
+    context.call('GET', 'subject_services')
+
+
+def address_autocomplete(context):
+    token = context.random.choice(context.tokens)
+    query = context.random.choice(ADDRESS_QUERIES)
+    params = {'view': 'compact'} if context.compact_geolocation else None
+
+    # Every typed character after the third one triggers a suggestion request
+    for length in range(3, len(query) + 1, 3):
+        context.call('POST', 'get_coords', token=token, params=params, json={'query': query[:length]})
+
+    context.call('POST', 'get_address', token=token, params=params,
+                 json={'lat': 55.03 + context.random.random() * 0.05, 'lon': 82.9 + context.random.random() * 0.05})
+
+
+def checkout(context):
+    token = context.random.choice(context.tokens)
+    units = [
+        {'subject_service': subject_service, 'units_count': context.random.choice((1, 2, 3))}
+        for subject_service in context.random.sample(context.subject_service_ids,
+                                                     min(len(context.subject_service_ids),
+                                                         context.random.randint(1, 5)))
+    ]
+
+    cart = context.call('POST', 'carts', token=token, json={'units': units})
+    context.call('POST', 'orders', token=token, json={
+        'cart': cart['id'],
+        'payment_method': context.random.choice(context.payment_method_ids),
+        'delivery_lat': 55.03,
+        'delivery_long': 82.92,
+        'delivery_address': 'Новосибирск, Красный проспект, 1',
+    })
+
+
+def driver_ping(context):
+    token = context.random.choice(context.driver_tokens or context.tokens)
+    context.call('POST', 'driver_location', token=token, json={
+        'lat': 55.03 + context.random.random() * 0.05,
+        'lon': 82.9 + context.random.random() * 0.05,
+    })
+
+
+JOURNEYS = {
+    'login': sms_login,
+    'catalog': browse_catalog,
+    'autocomplete': address_autocomplete,
+    'checkout': checkout,
+}
+
+# Share of each journey in the arrival rate of client traffic
+DEFAULT_WEIGHTS = {
+    'login': 0.1,
+    'catalog': 0.5,
+    'autocomplete': 0.25,
+    'checkout': 0.15,
+}
@@ -0,0 +1,186 @@
+"""
+Load test of a local instance with mixed client, login and driver traffic.
+
+    python -m loadtest.run http://127.0.0.1:8000 --config loadtest.json --stub-2gis-port 8099 \\
+        --rates 5 10 20 40 --stage-duration 60 --concurrency 64 --driver-rate 20
+
+The instance must use MAPS_2GIS_API_URL of the 2GIS stub (http://127.0.0.1:8099/3.0/items),
+which is started by --stub-2gis-port or separately with `python -m benchmarks.stub_2gis`.
+The config file may override endpoint paths and contains phones or tokens of test users
+and tokens of test drivers:
+
+    {"paths": {"orders": "/api/v0/orders/"}, "phones": ["+79990000001"], "tokens": ["..."],
+     "driver_tokens": ["..."]}
+
+Without phones and tokens --users new users with random phones are logged in. A configured
+phone can be logged in again only after SMSVerifier.code_expiration_time (300 s), so for
+repeated runs prefer tokens or fresh users. Failed journeys are counted by error kind.
+
+Journeys arrive as a Poisson stream (open model) at the given total rates per second,
+split by journey weights; driver location pings are a separate background stream.
+Latency is measured from the scheduled arrival time, so queueing in the harness
+under saturation is included. For every stage and journey throughput, error share and
+latency percentiles are reported; the saturation throughput of a journey is the highest
+throughput of a stage which kept the offered rate, the p99 objective and the error budget.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stats import summarize
+from benchmarks.stub_2gis import start_stub_server
+from loadtest.journeys import Context, JourneyError, JOURNEYS, DEFAULT_WEIGHTS, driver_ping, error_kind
+
+DRIVER_JOURNEY = 'driver_ping'
+
+
+def arrivals(rnd, rate, duration):
+    """
+    Returns arrival offsets of a Poisson stream with the given rate.
+    """
+    offsets = []
+    if rate <= 0:
+        return offsets
+
+    offset = rnd.expovariate(rate)
+    while offset < duration:
+        offsets.append(offset)
+        offset += rnd.expovariate(rate)
+    return offsets
+
+
+def run_stage(context, executor, rate, duration, weights, driver_rate, rnd):
+    schedule = []
+    for name, weight in weights.items():
+        schedule.extend((offset, name, JOURNEYS[name]) for offset in arrivals(rnd, rate * weight, duration))
+    schedule.extend((offset, DRIVER_JOURNEY, driver_ping) for offset in arrivals(rnd, driver_rate, duration))
+    schedule.sort(key=lambda item: item[0])
+
+    stats = {name: {'latencies': [], 'errors': Counter(), 'offered': 0} for name in list(weights) + [DRIVER_JOURNEY]}
+    lock = threading.Lock()
+
+    def execute(name, journey, scheduled):
+        try:
+            journey(context)
+        except Exception as e:
+            with lock:
+                stats[name]['errors'][error_kind(e)] += 1
+        else:
+            stats[name]['latencies'].append(time.perf_counter() - scheduled)
+
+    started = time.perf_counter()
+    futures = []
+    for offset, name, journey in schedule:
+        delay = started + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        stats[name]['offered'] += 1
+        futures.append(executor.submit(execute, name, journey, started + offset))
+
+    for future in futures:
+        future.result()
+    elapsed = max(time.perf_counter() - started, duration)
+
+    report = {}
+    for name, values in stats.items():
+        result = summarize(values['latencies'], elapsed)
+        result['offered_rps'] = values['offered'] / float(duration)
+        errors = sum(values['errors'].values())
+        result['errors'] = errors
+        result['error_types'] = dict(values['errors'].most_common())
+        result['error_share'] = errors / float(values['offered']) if values['offered'] else 0
+        report[name] = result
+    return report
+
+
+def saturation(stages, slo_ms, error_budget):
+    """
+    Returns {journey: highest throughput kept within the objectives}.
+    """
+    result = {}
+    for stage in stages:
+        for name, values in stage['journeys'].items():
+            if not values.get('count'):
+                continue
+
+            healthy = (values['p99_ms'] <= slo_ms and values['error_share'] <= error_budget and
+                       values['throughput_rps'] >= 0.9 * values['offered_rps'])
+            if healthy:
+                result[name] = max(result.get(name, 0), values['throughput_rps'])
+            else:
+                result.setdefault(name, 0)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base_url')
+    parser.add_argument('--config', default=None, help='JSON-файл с путями, телефонами и токенами водителей')
+    parser.add_argument('--rates', type=float, nargs='+', default=[5, 10, 20, 40],
+                        help='Суммарная частота пользовательских сценариев в секунду для каждой ступени')
+    parser.add_argument('--stage-duration', type=float, default=60, help='Длительность ступени в секундах')
+    parser.add_argument('--concurrency', type=int, default=64, help='Максимальное число одновременных сценариев')
+    parser.add_argument('--driver-rate', type=float, default=10, help='Частота отправки координат водителей')
+    parser.add_argument('--weights', default=None, help='JSON с долями сценариев, напр. {"catalog": 0.7}')
+    parser.add_argument('--full-geolocation', action='store_true', help='Запрашивать полный ответ 2GIS')
+    parser.add_argument('--slo-ms', type=float, default=1000, help='Целевое значение p99 в мс')
+    parser.add_argument('--error-budget', type=float, default=0.01, help='Допустимая доля ошибок')
+    parser.add_argument('--stub-2gis-port', type=int, default=None, help='Запустить заглушку 2GIS на этом порту')
+    parser.add_argument('--stub-2gis-latency', type=float, default=40, help='Задержка ответа заглушки 2GIS в мс')
+    parser.add_argument('--users', type=int, default=20,
+                        help='Число новых пользователей, если в конфигурации нет телефонов и токенов')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default=None, help='Путь к JSON-файлу с результатами')
+    args = parser.parse_args()
+
+    config = {}
+    if args.config:
+        with open(args.config, encoding='utf-8') as source:
+            config = json.load(source)
+
+    if args.stub_2gis_port:
+        stub, url = start_stub_server(args.stub_2gis_port, args.stub_2gis_latency)
+        print('2GIS stub: %s' % url)
+
+    weights = json.loads(args.weights) if args.weights else DEFAULT_WEIGHTS
+    context = Context(args.base_url, config.get('paths'), config.get('phones', ()), config.get('driver_tokens', ()),
+                      compact_geolocation=not args.full_geolocation, seed=args.seed,
+                      tokens=config.get('tokens', ()), users=args.users)
+    try:
+        context.prepare()
+    except JourneyError as e:
+        parser.exit(1, 'Подготовка нагрузочного теста не удалась: %s\n' % e)
+
+    rnd = random.Random(args.seed)
+    stages = []
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for rate in args.rates:
+            journeys = run_stage(context, executor, rate, args.stage_duration, weights, args.driver_rate, rnd)
+            stages.append({'rate': rate, 'journeys': journeys})
+
+            for name, values in sorted(journeys.items()):
+                if values.get('count'):
+                    print('%6.1f/s %-14s %7.1f rps  p50=%8.1fms p95=%8.1fms p99=%8.1fms  errors=%.1f%%' % (
+                        rate, name, values['throughput_rps'], values['p50_ms'], values['p95_ms'],
+                        values['p99_ms'], values['error_share'] * 100))
+                else:
+                    print('%6.1f/s %-14s no successful journeys, errors=%d' % (rate, name, values['errors']))
+                for kind, count in values['error_types'].items():
+                    print('%8s %-14s %6d  %s' % ('', '', count, kind))
+
+    limits = saturation(stages, args.slo_ms, args.error_budget)
+    print('\nSaturation throughput (p99 <= %.0fms, errors <= %.1f%%):' % (args.slo_ms, args.error_budget * 100))
+    for name, value in sorted(limits.items()):
+        print('  %-14s %7.1f rps' % (name, value))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump({'stages': stages, 'saturation': limits}, output, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
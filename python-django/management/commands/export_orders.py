@@ -0,0 +1,28 @@
+import sys
+
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from cleaning.export import filter_orders, iter_orders, WRITERS, EXPORT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "Выгружает заказы в CSV или NDJSON без загрузки всех заказов в память"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='export_format', choices=sorted(WRITERS.keys()), default='csv')
+        parser.add_argument('--output', default=None, help="Путь к файлу (по умолчанию stdout)")
+        parser.add_argument('--date-from', type=parse_date, default=None, help="Начальная дата (ГГГГ-ММ-ДД)")
+        parser.add_argument('--date-to', type=parse_date, default=None, help="Конечная дата включительно")
+        parser.add_argument('--status', action='append', default=None, help="Статус заказа (можно указать несколько)")
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        orders = filter_orders(options['date_from'], options['date_to'], options['status'])
+        lines = WRITERS[options['export_format']](iter_orders(orders, options['chunk_size']))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(lines)
+        else:
+            sys.stdout.writelines(lines)
@@ -4,10 +4,10 @@ import datetime
 import math
 import pytz
 from django.contrib.auth.base_user import BaseUserManager, AbstractBaseUser
-from django.db import models
+from django.db import models, transaction, connection
 from django.conf import settings
 from django.utils import dateformat, timezone
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save
 from django.dispatch import receiver
 from rest_framework.authtoken.models import Token
 from django.db.models import Avg, Max, Min, Model
@@ -364,23 +364,89 @@ class Order(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.pk:
-            self.delivery_price = self.calculate_delivery_price()
-            self.total = math.floor(self.calculate_summary() + self.delivery_price)
+            self.apply_pricing(self.calculate_summary_raw(), self.payment_method)
         super(Order, self).save(*args, **kwargs)
 
     def calculate_delivery_price(self):
-        summary = self.calculate_summary()
-        return MIN_ORDER_PRICE - summary if summary < MIN_ORDER_PRICE else 0
+        return Order.delivery_price_for(self.calculate_summary())
 
     def calculate_summary(self):
-        summary = 0
-        for unit in self.cart.units.all():
-            summary += unit.units_count * SubjectService.objects.get(pk=unit.subject_service.pk).price
+        return Order.with_commission(self.calculate_summary_raw(), self.payment_method)
+
+    def calculate_summary_raw(self):
+        return Order.carts_summary([self.cart_id])[self.cart_id]
+
+    @staticmethod
+    def with_commission(summary, payment_method):
+        return summary * COMMISSION_FACTOR if payment_method.prepayed else summary
+
+    @staticmethod
+    def delivery_price_for(summary):
+        return MIN_ORDER_PRICE - summary if summary < MIN_ORDER_PRICE else 0
+
+    @staticmethod
+    def carts_summary(cart_ids):
+        """
+        Returns {cart_id: summary} for all given carts using a single query
+        (commission is not applied, see Order.apply_pricing).
+        """
+        summaries = dict.fromkeys(cart_ids, 0)
+        units = CartUnit.objects.filter(cart__in=summaries.keys()).values_list(
+            'cart', 'units_count', 'subject_service__price')
+
+        for cart_id, units_count, price in units:
+            summaries[cart_id] += units_count * price
+
+        return summaries
+
+    def apply_pricing(self, summary, payment_method):
+        """
+        Sets delivery_price and total of a new order from the cart summary without commission.
+        Used both by Order.save and Order.bulk_checkout.
+        """
+        summary = Order.with_commission(summary, payment_method)
+        delivery_price = Order.delivery_price_for(summary)
+        self.total = math.floor(summary + delivery_price)
+        # Stored as an integer field, keep the in-memory value equal to the stored one
+        self.delivery_price = int(delivery_price)
 
-        if self.payment_method.prepayed:
-            summary *= COMMISSION_FACTOR
+    @staticmethod
+    def bulk_checkout(owner, orders_data):
+        """
+        Creates orders for several carts at once. Carts are priced with one query,
+        payment methods are fetched with one query and all orders are inserted
+        in a single transaction.
 
-        return summary
+        Returned orders always have primary keys: backends which cannot return ids
+        from a bulk insert get one INSERT per order. During that INSERT orders are
+        marked with `_batch_checkout`, so post_save hooks leave them to the caller.
+        """
+        summaries = Order.carts_summary([data['cart'] for data in orders_data])
+        payment_methods = PaymentMethod.objects.in_bulk([data['payment_method'] for data in orders_data])
+
+        orders = []
+        for data in orders_data:
+            order = Order(
+                owner=owner,
+                cart_id=data['cart'],
+                payment_method=payment_methods[data['payment_method']],
+                delivery_lat=data['delivery_lat'],
+                delivery_long=data['delivery_long'],
+                delivery_address=data['delivery_address'],
+            )
+            order.apply_pricing(summaries[data['cart']], order.payment_method)
+            orders.append(order)
+
+        with transaction.atomic():
+            if connection.features.can_return_ids_from_bulk_insert:
+                return Order.objects.bulk_create(orders)
+
+            for order in orders:
+                # Model.save is called directly: pricing is already applied
+                order._batch_checkout = True
+                models.Model.save(order)
+                del order._batch_checkout
+            return orders
 
     class Meta:
         get_latest_by = 'date_created'
@@ -392,6 +458,38 @@ class Order(models.Model):
         return 'Заказ №%d' % self.pk
 
 
+class OrderRollup(models.Model):
+    date = models.DateField(verbose_name="Дата", help_text="День создания заказов")
+
+    service = models.ForeignKey('Service', on_delete=models.CASCADE, verbose_name="Услуга")
+
+    subject = models.ForeignKey('Subject', on_delete=models.CASCADE, verbose_name="Предмет")
+
+    payment_method = models.ForeignKey('PaymentMethod', on_delete=models.CASCADE, verbose_name="Способ оплаты")
+
+    orders_count = models.IntegerField(default=0, verbose_name="Количество заказов",
+                                       help_text="Количество заказов, содержащих данную услугу для предмета")
+
+    units_count = models.FloatField(default=0, verbose_name="Количество единиц",
+                                    help_text="Общее количество заказанных единиц услуги")
+
+    total = models.FloatField(default=0, verbose_name="Сумма заказов",
+                              help_text="Доля сумм заказов, приходящаяся на данную услугу для предмета")
+
+    delivery_price = models.FloatField(default=0, verbose_name="Стоимость доставки",
+                                       help_text="Доля стоимости доставки, приходящаяся на данную услугу для предмета")
+
+    class Meta:
+        unique_together = ('date', 'service', 'subject', 'payment_method')
+        get_latest_by = 'date'
+        ordering = ['-date']
+        verbose_name = "сводка по заказам"
+        verbose_name_plural = "сводки по заказам"
+
+    def __str__(self):
+        return '%s: %s - %s (%s)' % (self.date, self.subject_id, self.service_id, self.payment_method_id)
+
+
 class MyUserManager(BaseUserManager):
     def create_user(self, phone, password=None):
         """
@@ -605,6 +703,26 @@ def create_auth_token(sender, instance=None, created=False, **kwargs):
         Token.objects.create(user=instance)
 
 
+@receiver(post_init, sender=Order)
+def remember_order_status(sender, instance=None, **kwargs):
+    instance._initial_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Order)
+def update_order_schedule_and_rollups(sender, instance=None, created=False, **kwargs):
+    # Orders of a batch checkout are scheduled and recorded by the caller
+    if getattr(instance, '_batch_checkout', False):
+        return
+
+    # Imported here because both modules import models
+    from cleaning.scheduler import update_load_calendar
+    from cleaning.rollups import update_order_rollups
+
+    update_load_calendar(instance, created)
+    update_order_rollups(instance, created, instance._initial_status)
+    instance._initial_status = instance.status
+
+
 class Client(User):
     last_lat = models.FloatField(blank=True, default=0, verbose_name="Последняя широта",
                                  help_text="Широта, которая была зарегистрирована при последнем "
@@ -0,0 +1,203 @@
+"""
+Routing of read-only queries to database replicas.
+
+Only explicitly read-only code is sent to replicas: viewsets with ReadReplicaMixin
+and reporting code called through run_on_replica() or wrapped into `with read_replica():`.
+Everything else, including all writes, keeps using the primary ('default') database.
+Replica connections are not checked before use; when a query on a replica fails,
+the replica is marked down for REPLICA_RETRY_SECONDS and the work is repeated
+on the primary.
+
+Settings:
+
+    DATABASES = {
+        'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'primary.sqlite3'},
+        'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'replica.sqlite3',
+                    'TEST': {'MIRROR': 'default'}},
+    }
+    DATABASE_ROUTERS = ['cleaning.replicas.ReplicaRouter']
+    DATABASE_REPLICAS = ['replica']
+    MIDDLEWARE += ['cleaning.replicas.ReplicaPinningMiddleware']
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+                          'LOCATION': '127.0.0.1:11211'}}
+    REPLICA_PIN_CACHE = 'default'
+
+Pins are kept in REPLICA_PIN_CACHE, which must be shared by all worker processes:
+a write handled by one worker has to pin reads handled by the others. Process-local
+backends (LocMemCache, DummyCache) are rejected when replicas are configured.
+
+For local testing both SQLite files can be created with `migrate` and
+`migrate --database replica`, then kept in sync by copying the primary file;
+a FileBasedCache is enough for pins of a single host.
+"""
+import hashlib
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, DEFAULT_DB_ALIAS, DatabaseError, OperationalError
+
+REPLICAS = getattr(settings, 'DATABASE_REPLICAS', [])
+
+# Reads of a client are pinned to the primary for this many seconds after its last write
+PIN_SECONDS = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+# Cache in which pins are kept, shared by all worker processes
+PIN_CACHE = getattr(settings, 'REPLICA_PIN_CACHE', 'default')
+
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# A replica which failed to connect is not used for this many seconds
+RETRY_SECONDS = getattr(settings, 'REPLICA_RETRY_SECONDS', 30)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = threading.local()
+_down_until = {}
+
+
+def mark_down(alias):
+    _down_until[alias] = time.time() + RETRY_SECONDS
+    try:
+        connections[alias].close()
+    except DatabaseError:
+        pass
+
+
+def get_read_database():
+    """
+    Returns an alias of a random replica which is not marked down, or the primary
+    database when reads are pinned or all replicas are down. Connections are not
+    checked here: a failed query is retried on the primary, see run_on_replica
+    and ReadReplicaMixin.
+    """
+    if getattr(_state, 'pinned', False):
+        return DEFAULT_DB_ALIAS
+
+    now = time.time()
+    replicas = [alias for alias in REPLICAS if _down_until.get(alias, 0) <= now]
+    return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def use_database(alias):
+    previous = getattr(_state, 'database', None)
+    _state.database = alias
+    try:
+        yield alias
+    finally:
+        _state.database = previous
+
+
+def read_replica():
+    """
+    Sends all reads inside the block to a replica.
+    """
+    return use_database(get_read_database())
+
+
+def run_on_replica(func, *args, **kwargs):
+    """
+    Calls func with reads sent to a replica. If the replica fails, it is marked down
+    and func is called again on the primary.
+    """
+    with read_replica() as alias:
+        try:
+            return func(*args, **kwargs)
+        except OperationalError:
+            if alias == DEFAULT_DB_ALIAS:
+                raise
+            mark_down(alias)
+
+    with use_database(DEFAULT_DB_ALIAS):
+        return func(*args, **kwargs)
+
+
+def client_key(request):
+    identity = (request.META.get('HTTP_AUTHORIZATION') or
+                request.COOKIES.get(settings.SESSION_COOKIE_NAME) or
+                request.META.get('REMOTE_ADDR', ''))
+    return 'replica-pin:%s' % hashlib.md5(identity.encode('utf-8')).hexdigest()
+
+
+class ReplicaRouter(object):
+    def db_for_read(self, model, **hints):
+        return getattr(_state, 'database', None)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
+
+
+class ReplicaPinningMiddleware(object):
+    """
+    Pins reads of a client to the primary for PIN_SECONDS after a successful write,
+    so that clients always see their own writes.
+    """
+
+    def __init__(self, get_response):
+        backend = settings.CACHES.get(PIN_CACHE, {}).get('BACKEND')
+        if REPLICAS and backend in LOCAL_CACHE_BACKENDS:
+            raise ImproperlyConfigured(
+                'REPLICA_PIN_CACHE "%s" (%s) не разделяется между процессами, '
+                'клиенты не увидят своих изменений' % (PIN_CACHE, backend))
+
+        self.get_response = get_response
+        self.cache = caches[PIN_CACHE]
+
+    def __call__(self, request):
+        key = client_key(request)
+        write = request.method not in SAFE_METHODS
+        _state.pinned = write or bool(self.cache.get(key))
+
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.pinned = False
+            _state.database = None
+
+        if write and response.status_code < 400:
+            self.cache.set(key, True, PIN_SECONDS)
+
+        return response
+
+
+class ReadReplicaMixin(object):
+    """
+    Viewset mixin which sends queries of safe requests to a replica.
+    If the replica fails during the request, the handler is run again on the primary.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            _state.database = get_read_database()
+        super(ReadReplicaMixin, self).initial(request, *args, **kwargs)
+
+    def handle_exception(self, exc):
+        alias = getattr(_state, 'database', None)
+        if isinstance(exc, OperationalError) and alias not in (None, DEFAULT_DB_ALIAS):
+            mark_down(alias)
+            _state.database = DEFAULT_DB_ALIAS
+            handler = getattr(self, self.request.method.lower(), self.http_method_not_allowed)
+            try:
+                return handler(self.request, *self.args, **self.kwargs)
+            except Exception as retry_exc:
+                exc = retry_exc
+
+        return super(ReadReplicaMixin, self).handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        _state.database = None
+        return super(ReadReplicaMixin, self).finalize_response(request, response, *args, **kwargs)
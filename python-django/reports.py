@@ -0,0 +1,60 @@
+from django.db.models import Sum
+from rest_framework import serializers, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from cleaning.models import OrderRollup
+from cleaning.replicas import run_on_replica
+
+GROUP_FIELDS = {
+    'date': 'date',
+    'service': 'service',
+    'subject': 'subject',
+    'payment_method': 'payment_method',
+}
+
+
+class RevenueReportSerializer(serializers.Serializer):
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    group_by = serializers.MultipleChoiceField(choices=list(GROUP_FIELDS.keys()), required=False)
+    service = serializers.IntegerField(required=False)
+    subject = serializers.IntegerField(required=False)
+    payment_method = serializers.IntegerField(required=False)
+
+
+@api_view(['GET'])
+@permission_classes((IsAdminUser,))
+def revenue_report(request):
+    serializer = RevenueReportSerializer(data=request.query_params)
+
+    if serializer.is_valid():
+        data = serializer.validated_data
+        rollups = OrderRollup.objects.filter(date__gte=data.get('date_from'), date__lte=data.get('date_to'))
+
+        for field in ('service', 'subject', 'payment_method'):
+            if data.get(field) is not None:
+                rollups = rollups.filter(**{'%s_id' % field: data.get(field)})
+
+        group_by = sorted(GROUP_FIELDS[field] for field in data.get('group_by', ()))
+
+        sums = dict(
+            units_count=Sum('units_count'),
+            total=Sum('total'),
+            delivery_price=Sum('delivery_price'),
+        )
+
+        # An order is counted in the rollup of every service and subject of its cart, so order
+        # counts add up only when both are fixed by grouping or by a filter
+        if all(field in group_by or data.get(field) is not None for field in ('service', 'subject')):
+            sums['orders_count'] = Sum('orders_count')
+
+        if group_by:
+            rows = run_on_replica(lambda: list(rollups.order_by(*group_by).values(*group_by).annotate(**sums)))
+        else:
+            rows = run_on_replica(lambda: [rollups.aggregate(**sums)])
+
+        return Response(data=rows, status=status.HTTP_200_OK)
+
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,138 @@
+"""
+Incrementally maintained daily rollups of orders by service, subject and payment method.
+
+Order total and delivery price are split between cart lines proportionally to the line cost,
+so the sum over all rollups of a day equals the sum of order totals of that day.
+Canceled orders are not counted.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Case, When, Value, IntegerField, FloatField
+from django.utils import timezone
+
+from cleaning.models import OrderRollup, CartUnit
+
+EXCLUDED_STATUS = 'CANCELED'
+
+
+def orders_deltas(orders, sign=1, deltas=None):
+    """
+    Accumulates rollup changes for the orders into {key: [orders, units, total, delivery_price]}
+    using a single query for cart lines of all orders.
+    """
+    if deltas is None:
+        deltas = defaultdict(lambda: [0, 0, 0, 0])
+
+    lines = defaultdict(list)
+    units = CartUnit.objects.filter(cart__in={order.cart_id for order in orders}).values_list(
+        'cart', 'units_count', 'subject_service__price', 'subject_service__service', 'subject_service__subject')
+    for cart_id, units_count, price, service_id, subject_id in units:
+        lines[cart_id].append((units_count, units_count * price, service_id, subject_id))
+
+    for order in orders:
+        cart_lines = lines[order.cart_id]
+        if not cart_lines:
+            continue
+
+        date = timezone.localtime(order.date_created).date()
+        summary = sum(cost for units_count, cost, service_id, subject_id in cart_lines)
+        keys = set()
+
+        for units_count, cost, service_id, subject_id in cart_lines:
+            share = cost / summary if summary else 1.0 / len(cart_lines)
+            key = (date, service_id, subject_id, order.payment_method_id)
+            delta = deltas[key]
+            if key not in keys:
+                delta[0] += sign
+                keys.add(key)
+            delta[1] += sign * units_count
+            delta[2] += sign * order.total * share
+            delta[3] += sign * order.delivery_price * share
+
+    return deltas
+
+
+ROLLUP_VALUES = (
+    ('orders_count', IntegerField()),
+    ('units_count', FloatField()),
+    ('total', FloatField()),
+    ('delivery_price', FloatField()),
+)
+
+
+def existing_rollups(keys):
+    """
+    Returns {key: pk} of rollups which exist for the given keys using a single query.
+    """
+    dates, services, subjects, payment_methods = (set(values) for values in zip(*keys))
+    rows = OrderRollup.objects.filter(date__in=dates, service__in=services, subject__in=subjects,
+                                      payment_method__in=payment_methods).order_by().values_list(
+        'pk', 'date', 'service', 'subject', 'payment_method')
+
+    keys = set(keys)
+    return {tuple(row[1:]): row[0] for row in rows if tuple(row[1:]) in keys}
+
+
+def apply_deltas(deltas):
+    """
+    Adds the deltas to rollups with one query for existing rollups, one bulk INSERT of
+    missing ones and one UPDATE of the rest, whatever the number of keys.
+    """
+    if not deltas:
+        return
+
+    for attempt in range(2):
+        existing = existing_rollups(list(deltas))
+        missing = []
+        for key, values in deltas.items():
+            if key in existing:
+                continue
+
+            date, service_id, subject_id, payment_method_id = key
+            orders_count, units_count, total, delivery_price = values
+            missing.append(OrderRollup(date=date, service_id=service_id, subject_id=subject_id,
+                                       payment_method_id=payment_method_id, orders_count=orders_count,
+                                       units_count=units_count, total=total, delivery_price=delivery_price))
+
+        if not missing:
+            break
+
+        try:
+            with transaction.atomic():
+                OrderRollup.objects.bulk_create(missing)
+            break
+        except IntegrityError:
+            # Some of the rollups were created concurrently, they are updated on the next attempt
+            if attempt:
+                raise
+
+    if not existing:
+        return
+
+    changes = {}
+    for index, (name, field) in enumerate(ROLLUP_VALUES):
+        changes[name] = F(name) + Case(*[When(pk=pk, then=Value(deltas[key][index])) for key, pk in existing.items()],
+                                       default=Value(0), output_field=field)
+    OrderRollup.objects.filter(pk__in=list(existing.values())).update(**changes)
+
+
+def record_orders(orders, sign=1):
+    """
+    Adds (or subtracts with sign=-1) the orders to rollups.
+    """
+    orders = [order for order in orders if order.status != EXCLUDED_STATUS or sign < 0]
+    if orders:
+        apply_deltas(orders_deltas(orders, sign))
+
+
+def update_order_rollups(order, created, previous_status):
+    """
+    Updates rollups after an order is saved, see the Order post_save receiver in models.py.
+    """
+    if created and order.status != EXCLUDED_STATUS:
+        record_orders([order])
+    elif not created and previous_status != EXCLUDED_STATUS and order.status == EXCLUDED_STATUS:
+        record_orders([order], sign=-1)
+    elif not created and previous_status == EXCLUDED_STATUS and order.status != EXCLUDED_STATUS:
+        record_orders([order])
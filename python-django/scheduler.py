@@ -0,0 +1,153 @@
+"""
+Scheduling of delivery dates by processing capacity.
+
+Capacity is tracked by an in-memory LoadCalendar of every process. A process sees
+its own reservations immediately and reservations of other processes only after the
+calendar is rebuilt from the database, which happens every
+PROCESSING_CALENDAR_REFRESH_SECONDS. With several workers a day may therefore be
+overbooked by orders scheduled by other workers within that interval; when capacity
+must never be exceeded, orders have to be scheduled by a single process.
+
+Settings:
+
+    PROCESSING_DAILY_CAPACITY_MINUTES = 4800
+    PROCESSING_CALENDAR_HORIZON_DAYS = 180
+    PROCESSING_CALENDAR_REFRESH_SECONDS = 300   # None disables periodic rebuilds
+"""
+import datetime
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum, FloatField
+from django.utils import timezone
+
+from cleaning.models import Order, CartUnit
+from cleaning.load_calendar import LoadCalendar, CalendarOverflow
+
+DAILY_CAPACITY_MINUTES = getattr(settings, 'PROCESSING_DAILY_CAPACITY_MINUTES', 4800)
+CALENDAR_HORIZON_DAYS = getattr(settings, 'PROCESSING_CALENDAR_HORIZON_DAYS', 180)
+CALENDAR_REFRESH_SECONDS = getattr(settings, 'PROCESSING_CALENDAR_REFRESH_SECONDS', 300)
+DELIVERY_HOUR = getattr(settings, 'DELIVERY_HOUR', 18)
+
+# Statuses in which an order no longer occupies processing capacity
+RELEASED_STATUSES = ('CANCELED', 'TRANSIT', 'DELIVERED')
+
+_calendar = None
+_calendar_built = 0
+_calendar_lock = threading.Lock()
+
+
+def carts_minutes(cart_ids):
+    """
+    Returns {cart_id: processing minutes} for the given carts using a single query.
+    """
+    minutes = dict.fromkeys(cart_ids, 0)
+    # Default ordering of units is cleared, otherwise it is added to GROUP BY
+    rows = CartUnit.objects.filter(cart__in=minutes.keys()).order_by().values('cart').annotate(
+        minutes=Sum(F('units_count') * F('subject_service__duration'), output_field=FloatField()))
+
+    for row in rows:
+        minutes[row['cart']] = int(math.ceil(row['minutes'] or 0))
+
+    return minutes
+
+
+def rebuild_calendar():
+    """
+    Builds the load calendar from scratch using active orders from the database.
+    Orders are placed in the order of creation starting from today.
+    """
+    global _calendar, _calendar_built
+
+    today = timezone.localdate()
+    calendar = LoadCalendar(today, CALENDAR_HORIZON_DAYS, DAILY_CAPACITY_MINUTES)
+
+    orders = list(Order.objects.exclude(status__in=RELEASED_STATUSES).order_by('date_created')
+                  .values_list('pk', 'cart'))
+    minutes = carts_minutes([cart_id for pk, cart_id in orders])
+
+    for pk, cart_id in orders:
+        try:
+            calendar.reserve(pk, minutes[cart_id], today)
+        except CalendarOverflow:
+            continue
+
+    with _calendar_lock:
+        _calendar = calendar
+        _calendar_built = time.time()
+
+    return calendar
+
+
+def get_calendar():
+    """
+    Returns the calendar of the current process, rebuilding it on first use, every
+    CALENDAR_REFRESH_SECONDS and once the first half of its horizon has passed.
+    """
+    calendar = _calendar
+    if (calendar is None or calendar.day_index(timezone.localdate()) > calendar.days // 2 or
+            CALENDAR_REFRESH_SECONDS is not None and time.time() - _calendar_built > CALENDAR_REFRESH_SECONDS):
+        calendar = rebuild_calendar()
+    return calendar
+
+
+def delivery_datetime(date):
+    return timezone.make_aware(datetime.datetime.combine(date, datetime.time(DELIVERY_HOUR)))
+
+
+def schedule_orders(orders):
+    """
+    Stores delivery dates of new orders within the current transaction. Orders finishing
+    on the same day are updated with a single query. Capacity is reserved in the
+    calendar only after the transaction is committed.
+    """
+    calendar = get_calendar()
+    today = timezone.localdate()
+    minutes = carts_minutes([order.cart_id for order in orders])
+    days = calendar.plan([minutes[order.cart_id] for order in orders], today)
+
+    by_date = {}
+    for order, day in zip(orders, days):
+        if day is None:
+            continue
+        order.delivery_date = delivery_datetime(day)
+        by_date.setdefault(order.delivery_date, []).append(order.pk)
+
+    for delivery_date, pks in by_date.items():
+        Order.objects.filter(pk__in=pks, delivery_date__isnull=True).update(delivery_date=delivery_date)
+
+    reservations = [(order.pk, minutes[order.cart_id]) for order in orders]
+    transaction.on_commit(lambda: reserve_orders(reservations, today))
+
+
+def reserve_orders(reservations, today):
+    # The current calendar is used, it may have been rebuilt since the orders were planned
+    calendar = get_calendar()
+    for pk, minutes in reservations:
+        try:
+            calendar.reserve(pk, minutes, today)
+        except CalendarOverflow:
+            pass
+
+
+def release_order(pk):
+    get_calendar().release(pk)
+
+
+def update_load_calendar(order, created):
+    """
+    Updates the calendar after an order is saved, see the Order post_save receiver in models.py.
+    """
+    calendar = get_calendar()
+
+    if order.status in RELEASED_STATUSES:
+        pk = order.pk
+        transaction.on_commit(lambda: release_order(pk))
+    elif created and order.delivery_date is None:
+        schedule_orders([order])
+    elif order.pk not in calendar:
+        reservations = [(order.pk, carts_minutes([order.cart_id])[order.cart_id])]
+        transaction.on_commit(lambda: reserve_orders(reservations, timezone.localdate()))
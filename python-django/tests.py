@@ -0,0 +1,200 @@
+import csv
+import datetime
+import random
+
+from django.test import SimpleTestCase
+
+from cleaning.export import iter_csv, EXPORT_FIELDS
+from cleaning.geolocation import wkt_centroid, compact_item
+from cleaning.load_calendar import LoadCalendar, CalendarOverflow
+
+
+class WKTCentroidTests(SimpleTestCase):
+    def assertPointEqual(self, actual, expected):
+        self.assertIsNotNone(actual)
+        self.assertAlmostEqual(actual[0], expected[0])
+        self.assertAlmostEqual(actual[1], expected[1])
+
+    def test_point(self):
+        self.assertPointEqual(wkt_centroid('POINT(82.92 55.03)'), (82.92, 55.03))
+
+    def test_multipoint(self):
+        self.assertPointEqual(wkt_centroid('MULTIPOINT((0 0), (2 4))'), (1, 2))
+        self.assertPointEqual(wkt_centroid('MULTIPOINT(0 0, 2 4)'), (1, 2))
+
+    def test_polygon(self):
+        self.assertPointEqual(wkt_centroid('POLYGON((0 0, 2 0, 2 2, 0 2, 0 0))'), (1, 1))
+
+    def test_polygon_ignores_holes(self):
+        wkt = 'POLYGON((0 0, 4 0, 4 4, 0 4, 0 0), (0 0, 1 0, 1 1, 0 1, 0 0))'
+        self.assertPointEqual(wkt_centroid(wkt), (2, 2))
+
+    def test_polygon_at_large_coordinates(self):
+        wkt = 'POLYGON((82.9 55.0, 82.9004 55.0, 82.9004 55.0004, 82.9 55.0004, 82.9 55.0))'
+        self.assertPointEqual(wkt_centroid(wkt), (82.9002, 55.0002))
+
+    def test_multipolygon_is_weighted_by_area(self):
+        wkt = 'MULTIPOLYGON(((0 0, 2 0, 2 2, 0 2, 0 0)), ((10 0, 14 0, 14 4, 10 4, 10 0)))'
+        self.assertPointEqual(wkt_centroid(wkt), ((1 * 4 + 12 * 16) / 20.0, (1 * 4 + 2 * 16) / 20.0))
+
+    def test_linestring_is_weighted_by_length(self):
+        self.assertPointEqual(wkt_centroid('LINESTRING(0 0, 2 0, 2 1)'), (4 / 3.0, 1 / 6.0))
+
+    def test_multilinestring(self):
+        self.assertPointEqual(wkt_centroid('MULTILINESTRING((0 0, 2 0), (10 10, 10 12))'), (5.5, 5.5))
+
+    def test_zero_length_linestring(self):
+        self.assertPointEqual(wkt_centroid('LINESTRING(1 1, 1 1)'), (1, 1))
+
+    def test_empty_and_unsupported(self):
+        self.assertIsNone(wkt_centroid('POINT EMPTY'))
+        self.assertIsNone(wkt_centroid('LINESTRING EMPTY'))
+        self.assertIsNone(wkt_centroid('GEOMETRYCOLLECTION(POINT(1 1))'))
+
+    def test_compact_street(self):
+        item = {
+            'name': 'улица Ленина',
+            'full_name': 'Новосибирск, улица Ленина',
+            'geometry': {'selection': 'LINESTRING(82.9 55.0, 82.91 55.0)'},
+        }
+        self.assertEqual(compact_item(item), {
+            'name': 'улица Ленина',
+            'address': 'Новосибирск, улица Ленина',
+            'lat': 55.0,
+            'lon': 82.905,
+        })
+
+
+class LoadCalendarTests(SimpleTestCase):
+    origin = datetime.date(2019, 1, 1)
+
+    def day(self, index):
+        return self.origin + datetime.timedelta(days=index)
+
+    def test_reserve_within_day(self):
+        calendar = LoadCalendar(self.origin, 10, 100)
+
+        self.assertEqual(calendar.reserve(1, 60, self.origin), self.day(0))
+        self.assertEqual(calendar.reserve(2, 40, self.origin), self.day(0))
+        self.assertEqual(calendar.reserve(3, 1, self.origin), self.day(1))
+        self.assertEqual(calendar.used[:2], [100, 1])
+
+    def test_reserve_spans_days(self):
+        calendar = LoadCalendar(self.origin, 10, 100)
+        calendar.reserve(1, 30, self.origin)
+
+        self.assertEqual(calendar.reserve(2, 250, self.origin), self.day(2))
+        self.assertEqual(calendar.allocations[2], [(0, 70), (1, 100), (2, 80)])
+
+    def test_reserve_not_before(self):
+        calendar = LoadCalendar(self.origin, 10, 100)
+
+        self.assertEqual(calendar.reserve(1, 150, self.day(3)), self.day(4))
+        self.assertEqual(calendar.used[:5], [0, 0, 0, 100, 50])
+
+    def test_reserve_skips_full_days(self):
+        calendar = LoadCalendar(self.origin, 10, 100)
+        for key in range(4):
+            calendar.reserve(key, 100, self.origin)
+        calendar.release(1)
+
+        self.assertEqual(calendar.reserve('new', 150, self.origin), self.day(4))
+        self.assertEqual(calendar.allocations['new'], [(1, 100), (4, 50)])
+
+    def test_reserve_again_replaces_reservation(self):
+        calendar = LoadCalendar(self.origin, 10, 100)
+        calendar.reserve(1, 80, self.origin)
+
+        self.assertEqual(calendar.reserve(1, 50, self.origin), self.day(0))
+        self.assertEqual(calendar.used[0], 50)
+        self.assertEqual(len(calendar), 1)
+
+    def test_zero_minutes(self):
+        calendar = LoadCalendar(self.origin, 10, 100)
+        calendar.reserve(1, 100, self.origin)
+
+        self.assertEqual(calendar.reserve(2, 0, self.origin), self.day(0))
+
+    def test_release(self):
+        calendar = LoadCalendar(self.origin, 10, 100)
+        calendar.reserve(1, 250, self.origin)
+        calendar.release(1)
+        calendar.release('unknown')
+
+        self.assertNotIn(1, calendar)
+        self.assertEqual(calendar.used, [0] * 10)
+        self.assertEqual(calendar.reserve(2, 100, self.origin), self.day(0))
+
+    def test_overflow(self):
+        calendar = LoadCalendar(self.origin, 3, 100)
+        calendar.reserve(1, 250, self.origin)
+
+        with self.assertRaises(CalendarOverflow):
+            calendar.reserve(2, 51, self.origin)
+        with self.assertRaises(CalendarOverflow):
+            calendar.reserve(3, 1, self.day(3))
+
+        self.assertNotIn(2, calendar)
+        self.assertEqual(calendar.used, [100, 100, 50])
+        self.assertEqual(calendar.reserve(4, 50, self.origin), self.day(2))
+
+    def test_plan_does_not_keep_reservations(self):
+        calendar = LoadCalendar(self.origin, 3, 100)
+        calendar.reserve(1, 50, self.origin)
+
+        self.assertEqual(calendar.plan([50, 250, 100, 50], self.origin),
+                         [self.day(0), None, self.day(1), self.day(2)])
+        self.assertEqual(calendar.used, [50, 0, 0])
+        self.assertEqual(len(calendar), 1)
+
+    def test_matches_day_by_day_scan(self):
+        rnd = random.Random(1)
+        days, capacity = 30, 480
+        calendar = LoadCalendar(self.origin, days, capacity)
+        used = [0] * days
+        allocations = {}
+
+        for key in range(2000):
+            if allocations and rnd.random() < 0.3:
+                released = rnd.choice(list(allocations))
+                for index, taken in allocations.pop(released):
+                    used[index] -= taken
+                calendar.release(released)
+                continue
+
+            minutes, start = rnd.randint(1, 600), rnd.randint(0, days - 1)
+            allocation, remaining, index = [], minutes, start
+            while remaining and index < days:
+                taken = min(capacity - used[index], remaining)
+                if taken:
+                    allocation.append((index, taken))
+                remaining -= taken
+                index += 1
+
+            if remaining:
+                with self.assertRaises(CalendarOverflow):
+                    calendar.reserve(key, minutes, self.day(start))
+                continue
+
+            for index, taken in allocation:
+                used[index] += taken
+            allocations[key] = allocation
+            self.assertEqual(calendar.reserve(key, minutes, self.day(start)), self.day(allocation[-1][0]))
+            self.assertEqual(calendar.allocations[key], allocation)
+
+        self.assertEqual(calendar.used, used)
+
+
+class ExportCSVTests(SimpleTestCase):
+    def test_formulas_are_escaped(self):
+        row = dict.fromkeys(EXPORT_FIELDS, '')
+        row.update(id=1, owner='+79990000001', delivery_address='=HYPERLINK("http://example.com")', total=-1,
+                   items=[{'subject': '@SUM(A1)', 'service': 'Стирка', 'units_count': 1, 'price': 100}])
+
+        header, line = list(iter_csv([row]))
+        values = dict(zip(EXPORT_FIELDS, next(csv.reader([line]))))
+
+        self.assertEqual(values['owner'], "'+79990000001")
+        self.assertEqual(values['delivery_address'], '\'=HYPERLINK("http://example.com")')
+        self.assertEqual(values['items'], "'@SUM(A1) / Стирка x 1")
+        self.assertEqual(values['total'], '-1')
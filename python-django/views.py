@@ -5,9 +5,11 @@ from .serializers.models_sz import *
 from django.shortcuts import get_object_or_404
 from rest_framework.decorators import detail_route, list_route, api_view
 from cleaning.models import SMSVerifier
+from cleaning.replicas import ReadReplicaMixin
+from cleaning.instrumentation import MeasuredSerializerMixin
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(ReadReplicaMixin, MeasuredSerializerMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = (AllowAny,)
     authentication_classes = ()
     queryset = Category.objects.all()
@@ -16,7 +18,7 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
         return CategorySerializer
 
 
-class SubjectViewSet(viewsets.ReadOnlyModelViewSet):
+class SubjectViewSet(ReadReplicaMixin, MeasuredSerializerMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = (AllowAny,)
     authentication_classes = ()
     queryset = Subject.objects.all()
@@ -25,7 +27,7 @@ class SubjectViewSet(viewsets.ReadOnlyModelViewSet):
         return SubjectSerializer
 
 
-class ServiceViewSet(viewsets.ReadOnlyModelViewSet):
+class ServiceViewSet(ReadReplicaMixin, MeasuredSerializerMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = (AllowAny,)
     authentication_classes = ()
     queryset = Service.objects.all()
@@ -34,7 +36,7 @@ class ServiceViewSet(viewsets.ReadOnlyModelViewSet):
         return ServiceSerializer
 
 
-class SubjectServiceViewSet(viewsets.ReadOnlyModelViewSet):
+class SubjectServiceViewSet(ReadReplicaMixin, MeasuredSerializerMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = (AllowAny,)
     authentication_classes = ()
     queryset = SubjectService.objects.all()
@@ -43,7 +45,7 @@ class SubjectServiceViewSet(viewsets.ReadOnlyModelViewSet):
         return SubjectServiceSerializer
 
 
-class PaymentMethodViewSet(viewsets.ReadOnlyModelViewSet):
+class PaymentMethodViewSet(ReadReplicaMixin, MeasuredSerializerMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = (AllowAny,)
     authentication_classes = ()
     queryset = PaymentMethod.objects.all()